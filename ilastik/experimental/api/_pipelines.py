@@ -19,14 +19,21 @@
 #          http://ilastik.org/license.html
 ###############################################################################
 # pyright: strict
+import hashlib
+import queue
+import threading
 import warnings
-from typing import Literal, Union
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Generic, Iterator, Literal, Optional, Tuple, TypeVar, Union
 
 import h5py
+import numpy
 import vigra
 import xarray
 
-from ilastik.applets.featureSelection.opFeatureSelection import OpFeatureSelection
+from ilastik.applets.featureSelection.opFeatureSelection import OpFeatureSelectionNoCache
 from ilastik.experimental import parser
 from ilastik.utility.slottools import DtypeConvertFunction
 from lazyflow.graph import Graph
@@ -35,6 +42,9 @@ from lazyflow.operators.classifierOperators import OpClassifierPredict
 from lazyflow.operators.generic import OpMultiArrayStacker, OpPixelOperator
 
 
+_Graph = TypeVar("_Graph")
+
+
 class PixelClassificationPipeline:
     """
     Pipeline for accessing trained Pixel Classification classifiers from Python
@@ -70,12 +80,13 @@ class PixelClassificationPipeline:
     """
 
     @classmethod
-    def from_ilp_file(cls, path: str) -> "PixelClassificationPipeline":
+    def from_ilp_file(cls, path: str, result_cache_bytes: int = 0) -> "PixelClassificationPipeline":
         """
         Create a Pixel Classification Pipeline instance from a trained project.ilp file
 
         Args:
             path: Path to the ilp file
+            result_cache_bytes: see `PixelClassificationPipeline.__init__`
 
         Returns:
             PixelClassificationPipeline instance configured with trained classifier
@@ -83,27 +94,36 @@ class PixelClassificationPipeline:
         with h5py.File(path, "r") as f:
             project = parser.PixelClassificationProject.model_validate(f)
 
-        return cls(project)
+        return cls(project, result_cache_bytes=result_cache_bytes)
 
-    def __init__(self, project: parser.PixelClassificationProject):
+    def __init__(self, project: parser.PixelClassificationProject, result_cache_bytes: int = 0):
+        """
+        Args:
+            project: parsed Pixel Classification project
+            result_cache_bytes: memory budget for keeping probability maps of previous calls, so that repeated
+              calls with identical input are answered without predicting again. Off (0) by default.
+              With the cache enabled, all returned probability maps are read-only, also those too large to be kept.
+        """
         self._num_spatial_dims = len(project.input_data.spatial_axes)
         self._num_channels = project.input_data.num_channels
+        # axis keys of the probability maps, determined on the first call
+        self._output_dims = None
 
-        graph = Graph()
-        self._reorder_op = OpReorderAxes(graph=graph, AxisOrder=ensure_channel_axis(project.input_data.axis_order))
+        self._graphs = _GraphPool(partial(_PixelClassificationGraph, project))
 
-        self._feature_sel_op = OpFeatureSelection(graph=graph)
-        self._feature_sel_op.InputImage.connect(self._reorder_op.Output)
-        self._feature_sel_op.FeatureIds.setValue(project.feature_matrix.names)
-        self._feature_sel_op.Scales.setValue(project.feature_matrix.scales)
-        self._feature_sel_op.SelectionMatrix.setValue(project.feature_matrix.selections)
-        self._feature_sel_op.ComputeIn2d.setValue(project.feature_matrix.compute_in_2d.tolist())
+        # content-keyed LRU of previous results, see `get_probabilities`
+        self._result_cache_bytes = result_cache_bytes
+        self._results = OrderedDict()
+        self._results_nbytes = 0
+        self._results_lock = threading.Lock()
 
-        self._predict_op = OpClassifierPredict(graph=graph)
-        self._predict_op.Classifier.setValue(project.classifier.classifier)
-        self._predict_op.Classifier.meta.classifier_factory = project.classifier.classifier_factory
-        self._predict_op.Image.connect(self._feature_sel_op.OutputImage)
-        self._predict_op.LabelsCount.setValue(project.classifier.label_count)
+    def clear_result_cache(self):
+        """
+        Drop all probability maps kept for repeated calls
+        """
+        with self._results_lock:
+            self._results.clear()
+            self._results_nbytes = 0
 
     def predict(self, data: Union[vigra.VigraArray, xarray.DataArray]) -> xarray.DataArray:
         warnings.warn(
@@ -116,27 +136,51 @@ class PixelClassificationPipeline:
         """
         Get pixel probability map from pipeline.
 
+        If the pipeline was created with a `result_cache_bytes` budget, repeated calls with identical data
+        are answered from a cache of previous results, and all returned arrays are read-only.
+        Can be called from several threads at once, each concurrent call uses its own lazyflow graph.
+        Graphs are kept for reuse afterwards, so the pipeline holds as many graphs as there were concurrent
+        calls at most. Idle graphs don't keep their input data, but the intermediate features of calls that
+        run at the same time add up in memory.
+
         Args:
             raw_data: image with same dimensionality as in the trained project file
         """
         raw_data = as_vigra_array(raw_data)
-        num_channels_in_data = raw_data.channels
-        if num_channels_in_data != self._num_channels:
-            raise ValueError(
-                f"Number of channels mismatch. Classifier trained for {self._num_channels} but input has {num_channels_in_data}"
-            )
-
-        num_spatial_in_data = sum(a.isSpatial() for a in raw_data.axistags)
-        if num_spatial_in_data != self._num_spatial_dims:
-            raise ValueError(
-                "Number of spatial dims doesn't match. "
-                f"Classifier trained for {self._num_spatial_dims} but input has {num_spatial_in_data}"
-            )
-
-        self._reorder_op.Input.setValue(raw_data)
-
-        probabilities = self._predict_op.PMaps.value[...]
-        return xarray.DataArray(probabilities, dims=tuple(self._predict_op.PMaps.meta.axistags.keys()))
+        _check_data(raw_data, num_channels=self._num_channels, num_spatial_dims=self._num_spatial_dims)
+
+        key = _content_key(raw_data) if self._result_cache_bytes > 0 else None
+        if key is not None:
+            with self._results_lock:
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    return xarray.DataArray(self._results[key], dims=self._output_dims)
+
+        with self._graphs.checkout() as graph:
+            # Every call brings new data, skip the element-wise comparison against the previous input
+            graph.reorder_op.Input.setValue(raw_data, check_changed=False)
+
+            probabilities = graph.predict_op.PMaps[:].wait()
+            if self._output_dims is None:
+                self._output_dims = tuple(graph.predict_op.PMaps.meta.axistags.keys())
+
+        if self._result_cache_bytes > 0:
+            # cached arrays are shared with the caller, so they must not be modified
+            probabilities.flags.writeable = False
+            if key is not None and probabilities.nbytes <= self._result_cache_bytes:
+                self._store_result(key, probabilities)
+        return xarray.DataArray(probabilities, dims=self._output_dims)
+
+    def _store_result(self, key: Tuple[object, ...], probabilities: numpy.ndarray):
+        with self._results_lock:
+            if key in self._results:
+                # computed concurrently by another thread
+                return
+            self._results[key] = probabilities
+            self._results_nbytes += probabilities.nbytes
+            while self._results_nbytes > self._result_cache_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self._results_nbytes -= evicted.nbytes
 
 
 class AutocontextPipeline:
@@ -177,79 +221,33 @@ class AutocontextPipeline:
     def __init__(self, project: parser.AutocontextProject):
         self._num_spatial_dims = len(project.input_data.spatial_axes)
         self._num_channels = project.input_data.num_channels
+        # axis keys of the probability maps, determined on the first call (identical for both stages)
+        self._output_dims = None
 
-        graph = Graph()
-        self._reorder_op = OpReorderAxes(graph=graph, AxisOrder=ensure_channel_axis(project.input_data.axis_order))
-
-        self._feature_sel_op_stage1 = OpFeatureSelection(graph=graph)
-        self._feature_sel_op_stage1.InputImage.connect(self._reorder_op.Output)
-        self._feature_sel_op_stage1.FeatureIds.setValue(project.feature_matrix_stage1.names)
-        self._feature_sel_op_stage1.Scales.setValue(project.feature_matrix_stage1.scales)
-        self._feature_sel_op_stage1.SelectionMatrix.setValue(project.feature_matrix_stage1.selections)
-        self._feature_sel_op_stage1.ComputeIn2d.setValue(project.feature_matrix_stage1.compute_in_2d.tolist())
-
-        self._predict_op_stage1 = OpClassifierPredict(graph=graph)
-        self._predict_op_stage1.Classifier.setValue(project.classifier_stage1.classifier)
-        self._predict_op_stage1.Classifier.meta.classifier_factory = project.classifier_stage1.classifier_factory
-        self._predict_op_stage1.Image.connect(self._feature_sel_op_stage1.OutputImage)
-        self._predict_op_stage1.LabelsCount.setValue(project.classifier_stage1.label_count)
-
-        # add stacking
-        self._opConvertPMapsToInputPixelType = OpPixelOperator(graph=graph)
-        self._opConvertPMapsToInputPixelType.Input.connect(self._predict_op_stage1.PMaps)
-        self._opConvertPMapsToInputPixelType.Function.setValue(lambda x: x)
-
-        self._opStacker = OpMultiArrayStacker(graph=graph)
-        self._opStacker.Images.resize(2)
-        self._opStacker.Images[0].connect(self._reorder_op.Output)
-        self._opStacker.Images[1].connect(self._opConvertPMapsToInputPixelType.Output)
-        self._opStacker.AxisFlag.setValue("c")
-
-        self._feature_sel_op_stage2 = OpFeatureSelection(graph=graph)
-        self._feature_sel_op_stage2.InputImage.connect(self._opStacker.Output)
-        self._feature_sel_op_stage2.FeatureIds.setValue(project.feature_matrix_stage2.names)
-        self._feature_sel_op_stage2.Scales.setValue(project.feature_matrix_stage2.scales)
-        self._feature_sel_op_stage2.SelectionMatrix.setValue(project.feature_matrix_stage2.selections)
-        self._feature_sel_op_stage2.ComputeIn2d.setValue(project.feature_matrix_stage2.compute_in_2d.tolist())
-
-        self._predict_op_stage2 = OpClassifierPredict(graph=graph)
-        self._predict_op_stage2.Classifier.setValue(project.classifier_stage2.classifier)
-        self._predict_op_stage2.Classifier.meta.classifier_factory = project.classifier_stage2.classifier_factory
-        self._predict_op_stage2.Image.connect(self._feature_sel_op_stage2.OutputImage)
-        self._predict_op_stage2.LabelsCount.setValue(project.classifier_stage2.label_count)
+        self._graphs = _GraphPool(partial(_AutocontextGraph, project))
 
     def _get_probabilities(self, raw_data: Union[vigra.VigraArray, xarray.DataArray], stage: Literal[1, 2]):
         raw_data = as_vigra_array(raw_data)
-        num_channels_in_data = raw_data.channels
+        _check_data(raw_data, num_channels=self._num_channels, num_spatial_dims=self._num_spatial_dims)
 
-        fun_convert = DtypeConvertFunction(raw_data.dtype)
-
-        if self._opConvertPMapsToInputPixelType.Function.value != fun_convert:
-            self._opConvertPMapsToInputPixelType.Function.setValue(fun_convert)
+        if stage not in (1, 2):
+            raise ValueError(f"Invalid argument {stage=}. There are only stage 1 and 2.")
 
-        if num_channels_in_data != self._num_channels:
-            raise ValueError(
-                f"Number of channels mismatch. Classifier trained for {self._num_channels} but input has {num_channels_in_data}"
-            )
+        with self._graphs.checkout() as graph:
+            fun_convert = DtypeConvertFunction(raw_data.dtype)
 
-        num_spatial_in_data = sum(a.isSpatial() for a in raw_data.axistags)
-        if num_spatial_in_data != self._num_spatial_dims:
-            raise ValueError(
-                "Number of spatial dims doesn't match. "
-                f"Classifier trained for {self._num_spatial_dims} but input has {num_spatial_in_data}"
-            )
+            if graph.opConvertPMapsToInputPixelType.Function.value != fun_convert:
+                graph.opConvertPMapsToInputPixelType.Function.setValue(fun_convert)
 
-        self._reorder_op.Input.setValue(raw_data)
+            # Every call brings new data, skip the element-wise comparison against the previous input
+            graph.reorder_op.Input.setValue(raw_data, check_changed=False)
 
-        if stage == 1:
-            predict_op = self._predict_op_stage1
-        elif stage == 2:
-            predict_op = self._predict_op_stage2
-        else:
-            raise ValueError(f"Invalid argument {stage=}. There are only stage 1 and 2.")
+            predict_op = graph.predict_op_stage1 if stage == 1 else graph.predict_op_stage2
 
-        probabilities = predict_op.PMaps.value[...]
-        return xarray.DataArray(probabilities, dims=tuple(predict_op.PMaps.meta.axistags.keys()))
+            probabilities = predict_op.PMaps[:].wait()
+            if self._output_dims is None:
+                self._output_dims = tuple(predict_op.PMaps.meta.axistags.keys())
+        return xarray.DataArray(probabilities, dims=self._output_dims)
 
     def get_probabilities_stage_1(self, raw_data: Union[vigra.VigraArray, xarray.DataArray]) -> xarray.DataArray:
         """
@@ -270,6 +268,103 @@ class AutocontextPipeline:
         return self._get_probabilities(raw_data, stage=2)
 
 
+class _PixelClassificationGraph:
+    """
+    Lazyflow operators computing pixel classification probabilities for a single input image
+    """
+
+    def __init__(self, project: parser.PixelClassificationProject):
+        graph = Graph()
+        self.reorder_op = OpReorderAxes(graph=graph, AxisOrder=ensure_channel_axis(project.input_data.axis_order))
+
+        self.feature_sel_op = OpFeatureSelectionNoCache(graph=graph)
+        self.feature_sel_op.InputImage.connect(self.reorder_op.Output)
+        self.feature_sel_op.FeatureIds.setValue(project.feature_matrix.names)
+        self.feature_sel_op.Scales.setValue(project.feature_matrix.scales)
+        self.feature_sel_op.SelectionMatrix.setValue(project.feature_matrix.selections)
+        self.feature_sel_op.ComputeIn2d.setValue(project.feature_matrix.compute_in_2d.tolist())
+
+        self.predict_op = OpClassifierPredict(graph=graph)
+        self.predict_op.Classifier.setValue(project.classifier.classifier)
+        self.predict_op.Classifier.meta.classifier_factory = project.classifier.classifier_factory
+        self.predict_op.Image.connect(self.feature_sel_op.OutputImage)
+        self.predict_op.LabelsCount.setValue(project.classifier.label_count)
+
+
+class _AutocontextGraph:
+    """
+    Lazyflow operators computing both autocontext stages for a single input image
+    """
+
+    def __init__(self, project: parser.AutocontextProject):
+        graph = Graph()
+        self.reorder_op = OpReorderAxes(graph=graph, AxisOrder=ensure_channel_axis(project.input_data.axis_order))
+
+        self.feature_sel_op_stage1 = OpFeatureSelectionNoCache(graph=graph)
+        self.feature_sel_op_stage1.InputImage.connect(self.reorder_op.Output)
+        self.feature_sel_op_stage1.FeatureIds.setValue(project.feature_matrix_stage1.names)
+        self.feature_sel_op_stage1.Scales.setValue(project.feature_matrix_stage1.scales)
+        self.feature_sel_op_stage1.SelectionMatrix.setValue(project.feature_matrix_stage1.selections)
+        self.feature_sel_op_stage1.ComputeIn2d.setValue(project.feature_matrix_stage1.compute_in_2d.tolist())
+
+        self.predict_op_stage1 = OpClassifierPredict(graph=graph)
+        self.predict_op_stage1.Classifier.setValue(project.classifier_stage1.classifier)
+        self.predict_op_stage1.Classifier.meta.classifier_factory = project.classifier_stage1.classifier_factory
+        self.predict_op_stage1.Image.connect(self.feature_sel_op_stage1.OutputImage)
+        self.predict_op_stage1.LabelsCount.setValue(project.classifier_stage1.label_count)
+
+        # add stacking
+        self.opConvertPMapsToInputPixelType = OpPixelOperator(graph=graph)
+        self.opConvertPMapsToInputPixelType.Input.connect(self.predict_op_stage1.PMaps)
+        self.opConvertPMapsToInputPixelType.Function.setValue(lambda x: x)
+
+        self.opStacker = OpMultiArrayStacker(graph=graph)
+        self.opStacker.Images.resize(2)
+        self.opStacker.Images[0].connect(self.reorder_op.Output)
+        self.opStacker.Images[1].connect(self.opConvertPMapsToInputPixelType.Output)
+        self.opStacker.AxisFlag.setValue("c")
+
+        self.feature_sel_op_stage2 = OpFeatureSelectionNoCache(graph=graph)
+        self.feature_sel_op_stage2.InputImage.connect(self.opStacker.Output)
+        self.feature_sel_op_stage2.FeatureIds.setValue(project.feature_matrix_stage2.names)
+        self.feature_sel_op_stage2.Scales.setValue(project.feature_matrix_stage2.scales)
+        self.feature_sel_op_stage2.SelectionMatrix.setValue(project.feature_matrix_stage2.selections)
+        self.feature_sel_op_stage2.ComputeIn2d.setValue(project.feature_matrix_stage2.compute_in_2d.tolist())
+
+        self.predict_op_stage2 = OpClassifierPredict(graph=graph)
+        self.predict_op_stage2.Classifier.setValue(project.classifier_stage2.classifier)
+        self.predict_op_stage2.Classifier.meta.classifier_factory = project.classifier_stage2.classifier_factory
+        self.predict_op_stage2.Image.connect(self.feature_sel_op_stage2.OutputImage)
+        self.predict_op_stage2.LabelsCount.setValue(project.classifier_stage2.label_count)
+
+
+class _GraphPool(Generic[_Graph]):
+    """
+    Idle lazyflow graphs of a pipeline, so that predictions can run in several threads at once
+
+    Graphs are only set up when needed: a pipeline that never predicts doesn't allocate any operators,
+    and further graphs are only added while all existing ones are in use by other threads.
+    The pool doesn't shrink, so the input of a graph is released when it is checked in again.
+    """
+
+    def __init__(self, build_graph: Callable[[], _Graph]):
+        self._build_graph = build_graph
+        self._idle: "queue.SimpleQueue[_Graph]" = queue.SimpleQueue()
+
+    @contextmanager
+    def checkout(self) -> Iterator[_Graph]:
+        try:
+            graph = self._idle.get_nowait()
+        except queue.Empty:
+            graph = self._build_graph()
+        try:
+            yield graph
+        finally:
+            # don't keep the last input image alive while the graph is idle
+            graph.reorder_op.Input.disconnect()
+            self._idle.put(graph)
+
+
 def ensure_channel_axis(axis_order):
     if "c" not in axis_order:
         return axis_order + "c"
@@ -298,3 +393,36 @@ def as_vigra_array(data: Union[vigra.VigraArray, xarray.DataArray]) -> vigra.Vig
         return vigra.taggedView(data.values, data.dims)
 
     raise NotImplementedError(f"Data type '{type(data)}' not supported, use `vigra.VigraArray` or `xarray.DataArray`.")
+
+
+def _check_data(data: vigra.VigraArray, num_channels: int, num_spatial_dims: int):
+    num_channels_in_data = data.channels
+    if num_channels_in_data != num_channels:
+        raise ValueError(
+            f"Number of channels mismatch. Classifier trained for {num_channels} but input has {num_channels_in_data}"
+        )
+
+    num_spatial_in_data = sum(a.isSpatial() for a in data.axistags)
+    if num_spatial_in_data != num_spatial_dims:
+        raise ValueError(
+            "Number of spatial dims doesn't match. "
+            f"Classifier trained for {num_spatial_dims} but input has {num_spatial_in_data}"
+        )
+
+
+def _content_key(data: vigra.VigraArray) -> Optional[Tuple[object, ...]]:
+    """
+    Key identifying the content of an input image, used to look up previous results
+
+    Any dense memory layout is hashed without a copy, this includes the axis orders of multi-channel
+    VigraArrays. Returns None for inputs with gaps or overlaps in memory (e.g. strided slices or
+    broadcast views), hashing those would require a full copy.
+    """
+    array = data.view(numpy.ndarray)
+    # hashlib needs a C-contiguous buffer: view the array with its axes in memory order, which is
+    # C-contiguous for every dense layout. Strides are part of the key to tell memory layouts apart.
+    buffer = array.transpose(numpy.argsort(array.strides, kind="stable")[::-1])
+    if not buffer.flags.c_contiguous:
+        return None
+    digest = hashlib.blake2b(buffer.data, digest_size=16).digest()
+    return (array.shape, array.strides, array.dtype.str, tuple(data.axistags.keys()), digest)
@@ -18,9 +18,10 @@
 # on the ilastik web site at:
 # 		   http://ilastik.org/license.html
 ###############################################################################
-from qtpy.QtCore import QObject, QEvent
+import threading
+
+from qtpy.QtCore import QObject, QEvent, Qt, Signal
 from qtpy.QtWidgets import QApplication
-from functools import partial
 
 
 class ThunkEvent(QEvent):
@@ -31,15 +32,15 @@ class ThunkEvent(QEvent):
 
     EventType = QEvent.Type(QEvent.registerEventType())
 
+    __slots__ = ("_func", "_args")
+
     def __init__(self, func, *args):
         QEvent.__init__(self, self.EventType)
-        if len(args) > 0:
-            self.thunk = partial(func, *args)
-        else:
-            self.thunk = func
+        self._func = func
+        self._args = args
 
     def __call__(self):
-        self.thunk()
+        self._func(*self._args)
 
     @classmethod
     def post(cls, handlerObject, func, *args):
@@ -55,9 +56,12 @@ class ThunkEvent(QEvent):
 class ThunkEventHandler(QObject):
     """
     GUI objects can instantiate an instance of this class and then start using it to
-    post ``ThunkEvents``, which execute a given callable in the GUI event loop.
-    The callable will NOT be called synchronously.  It will be called when the QT
-    event system eventually passes the event to the GUI object's event filters.
+    post callables, which are executed in the GUI event loop.
+    Posted callables will NOT be called synchronously.  ``post`` emits a signal with a
+    queued connection, so the callable is called once the QT event loop of the handler's
+    thread gets to it.  If the same callable is posted again with equal arguments before
+    it was executed, it is only called once, at the position of the latest post.
+    Only ``send`` goes through ``ThunkEvents`` and the GUI object's event filters.
 
     In the following example, ``C.setCaption()`` can be called from ANY thread safely.
     The widget's text will ONLY be updated in the main thread, at some point in the future.
@@ -74,12 +78,29 @@ class ThunkEventHandler(QObject):
                self.thunkEventHandler.post( self.mywidget.setText, text )
     """
 
+    _postThunk = Signal(object, object, object)
+
     def __init__(self, parent):
         """
         Create a ThunkEventHandler that installs itself in the event loop for ``parent``.
         """
         QObject.__init__(self, parent)
         parent.installEventFilter(self)
+        self._postThunk.connect(self._handlePostedThunk, Qt.QueuedConnection)
+
+        # Number of not yet executed posts per (func, args)
+        self._pending = {}
+        self._pendingLock = threading.Lock()
+
+    def _handlePostedThunk(self, func, args, key):
+        if key is not None:
+            with self._pendingLock:
+                remaining = self._pending.pop(key) - 1
+                if remaining > 0:
+                    # The same call has been posted again in the meantime, only the latest one is executed.
+                    self._pending[key] = remaining
+                    return
+        func(*args)
 
     def eventFilter(self, obj, event):
         if event.type() == ThunkEvent.EventType:
@@ -92,9 +113,21 @@ class ThunkEventHandler(QObject):
     def post(self, func, *args):
         """
         Post an event to the GUI event system that will eventually execute the given function with the given arguments.
-        This is implemented using ``QApplication.post()``
+        This is implemented using a queued signal connection, so no ``ThunkEvent`` has to pass the event filters.
+
+        If the same function is posted again with equal arguments before the GUI got to execute it,
+        only the most recent post is executed.
         """
-        ThunkEvent.post(self.parent(), func, *args)
+        key = (func, args)
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable arguments, can't be coalesced
+            key = None
+        else:
+            with self._pendingLock:
+                self._pending[key] = self._pending.get(key, 0) + 1
+        self._postThunk.emit(func, args, key)
 
     def send(self, func, *args):
         """
@@ -24,6 +24,7 @@ from builtins import zip
 ###############################################################################
 import collections
 import copy
+import functools
 import logging
 import numpy
 import vigra
@@ -120,23 +121,15 @@ class OpReorderAxes(Operator):
         if tagged_max_blockshape:
             self.Output.meta.max_blockshape = max_blockshape
 
-        # These map between input axis indexes and output axis indexes
-        # (Used to translate between input/output rois in execute() and propagateDirty())
-        self._in_out_map = list(
-            map(partial(_index, output_order), input_order)
-        )  # For "abcd" and "bcde" in_out = [-1, 0, 1, 2]
-        self._out_in_map = list(
-            map(partial(_index, input_order), output_order)
-        )  # For "abcd" and "bcde" out_in = [1, 2, 3, -1]
-
-        # Find the 'common' axes shared by both the input and output
-        input_common_axes = [a for a in input_order if a in output_order]  # Ordered by appearance on the input
-        output_common_axes = [a for a in output_order if a in input_order]  # Ordered by appearance on the output
-
-        # These are used by execute() to create a view of the 'result' array for the input to write into
-        self._out_squeeze_slicing = tuple(slice(None) if a in input_order else 0 for a in output_order)
-        self._common_axis_transpose_order = list(map(output_common_axes.index, input_common_axes))
-        self._in_unsqueeze_slicing = tuple(slice(None) if a in output_order else numpy.newaxis for a in input_order)
+        (
+            self._in_out_map,
+            self._out_in_map,
+            self._out_squeeze_slicing,
+            self._common_axis_transpose_order,
+            self._in_unsqueeze_slicing,
+        ) = _reorder_plan(tuple(input_order), output_order)
+        # Input already has the requested axis order: rois and result buffers can be passed through as they are
+        self._is_passthrough = tuple(input_order) == tuple(output_order)
 
     def execute(self, slot, subindex, out_roi, result):
         assert slot == self.Output, "Unknown output slot: {}".format(slot.name)
@@ -144,6 +137,10 @@ class OpReorderAxes(Operator):
             "Can't exceute this OpReorderAxes because you are attempting to drop "
             "the following non-singleton axes: {}.".format(self._invalid_axes)
         )
+        if self._is_passthrough:
+            self.Input(out_roi.start, out_roi.stop).writeInto(result).wait()
+            return result
+
         out_roi_dict = dict(enumerate(zip(out_roi.start, out_roi.stop)))
         out_roi_dict[-1] = (0, 1)  # Input axes that are missing on the output map to roi of 0:1
 
@@ -183,6 +180,10 @@ class OpReorderAxes(Operator):
                 in_roi, self.Input.meta.shape
             )
 
+            if self._is_passthrough:
+                self.Output.setDirty(in_roi.start, in_roi.stop)
+                return
+
             in_roi_dict = dict(enumerate(zip(in_roi.start, in_roi.stop)))
             in_roi_dict[-1] = (0, 1)  # Output axes that are missing on the input map to roi 0:1
 
@@ -193,6 +194,32 @@ class OpReorderAxes(Operator):
             assert False, "Unknown input slot: {}".format(inputSlot.name)
 
 
+@functools.lru_cache(maxsize=64)
+def _reorder_plan(input_order, output_order):
+    """
+    Index maps, slicings and transpose order used by OpReorderAxes to translate
+    between the given axis orders.
+
+    Only a handful of axis order pairs occur in a graph, so the plan is cached
+    instead of being recomputed in every setupOutputs().
+    """
+    # These map between input axis indexes and output axis indexes
+    # (Used to translate between input/output rois in execute() and propagateDirty())
+    in_out_map = tuple(map(partial(_index, output_order), input_order))  # For "abcd" and "bcde" in_out = (-1, 0, 1, 2)
+    out_in_map = tuple(map(partial(_index, input_order), output_order))  # For "abcd" and "bcde" out_in = (1, 2, 3, -1)
+
+    # Find the 'common' axes shared by both the input and output
+    input_common_axes = [a for a in input_order if a in output_order]  # Ordered by appearance on the input
+    output_common_axes = [a for a in output_order if a in input_order]  # Ordered by appearance on the output
+
+    # These are used by execute() to create a view of the 'result' array for the input to write into
+    out_squeeze_slicing = tuple(slice(None) if a in input_order else 0 for a in output_order)
+    common_axis_transpose_order = tuple(map(output_common_axes.index, input_common_axes))
+    in_unsqueeze_slicing = tuple(slice(None) if a in output_order else numpy.newaxis for a in input_order)
+
+    return in_out_map, out_in_map, out_squeeze_slicing, common_axis_transpose_order, in_unsqueeze_slicing
+
+
 # Helper function: Like list.index(), but return -1 for missing elements instead of raising a ValueError
 def _index(tup, element):
     try:
@@ -32,7 +32,7 @@ import vigra
 from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.operators.opCache import ManagedBlockedCache
 from lazyflow.request import RequestLock
-from lazyflow.roi import getIntersection, roiFromShape, roiToSlice, containing_rois
+from lazyflow.roi import roiFromShape, roiToSlice, containing_rois, intersecting_rois
 
 import logging
 
@@ -217,11 +217,9 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
             # Everything is dirty, so no need to loop
             self._resetBlocks()
         else:
-            # FIXME: This is O(N) for now.
-            #        We should speed this up by maintaining a bookkeeping data structure in execute().
-            for block_roi in list(self._block_data.keys()):
-                if getIntersection(block_roi, dirty_roi, assertIntersect=False):
-                    self.freeBlock(block_roi)
+            # Find the affected blocks with a single vectorized comparison over all block rois
+            for block_roi in intersecting_rois(list(self._block_data.keys()), dirty_roi):
+                self.freeBlock(self._standardize_roi(*block_roi))
 
         self.Output.setDirty(roi.start, roi.stop)
 
@@ -494,6 +494,32 @@ def containing_rois(rois, inner_roi):
     return rois[matching_rows]
 
 
+def intersecting_rois(rois, roi):
+    """
+    Given a list of rois and another roi,
+    return the subset of rois that overlap with the given roi.
+    An empty roi (start == stop along any axis) doesn't overlap with anything.
+
+    Example:
+        >>> rois = [([0,0,0], [10,10,10]),
+        ...         ([5,3,2], [11,12,13]),
+        ...         ([4,6,4], [5,9,9])]
+        >>> intersecting_rois( rois, ( [10,0,0], [12,5,5] ) )
+        array([[[ 5,  3,  2],
+                [11, 12, 13]]])
+    """
+    if not rois:
+        return numpy.array([])
+    rois = numpy.asarray(rois)
+    if (numpy.asarray(roi[1]) <= numpy.asarray(roi[0])).any():
+        return rois[:0]
+    left_matches = rois[:, 0] < roi[1]
+    right_matches = rois[:, 1] > roi[0]
+    both_matches = numpy.logical_and(left_matches, right_matches)
+    matching_rows = numpy.logical_and.reduce(both_matches, axis=1).nonzero()
+    return rois[matching_rows]
+
+
 def enlargeRoiForHalo(start, stop, shape, sigma, window=3.5, enlarge_axes=None, return_result_roi=False):
     """
     Enlarge the given roi (start,stop) with a halo according to the given
@@ -1,10 +1,17 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock
+
 import imageio.v3 as iio
 import numpy as np
 import pytest
+import vigra
 import xarray
 from pydantic import ValidationError
 
 from ilastik.experimental.api import AutocontextPipeline, PixelClassificationPipeline, from_project_file
+from ilastik.experimental.api._pipelines import _content_key
 
 from ..types import ApiTestDataLookup, Dataset, TestData, TestProjects
 
@@ -96,6 +103,105 @@ class TestIlastikApiPixelClassification:
         assert prediction.shape == expected_prediction.shape
         np.testing.assert_array_almost_equal(prediction, expected_prediction, decimal=1)
 
+    @pytest.mark.parametrize(
+        "input_, proj",
+        [
+            (TestData.DATA_1_CHANNEL, TestProjects.PIXEL_CLASS_1_CHANNEL_XY),
+        ],
+    )
+    def test_predict_repeated_identical_input(self, test_data_lookup: ApiTestDataLookup, input_, proj):
+        project_path = test_data_lookup.find_project(proj)
+        input_dataset = test_data_lookup.find_dataset(input_)
+
+        expected_prediction = _load_as_xarray(test_data_lookup.find_test_result(proj, input_, "Probabilities"))
+        pipeline = PixelClassificationPipeline.from_ilp_file(project_path, result_cache_bytes=2**30)
+
+        first_prediction = pipeline.get_probabilities(_load_as_xarray(input_dataset))
+        # cached results are shared, modifying them is not allowed
+        with pytest.raises(ValueError):
+            first_prediction.values[...] = 0
+
+        # answered from the cache, without running the graph
+        with mock.patch.object(pipeline._graphs, "checkout", side_effect=AssertionError("cache miss")):
+            prediction = pipeline.get_probabilities(_load_as_xarray(input_dataset))
+        assert prediction.shape == expected_prediction.shape
+        assert_predictions_equal_ilastik_cross(prediction, expected_prediction)
+
+        pipeline.clear_result_cache()
+        with mock.patch.object(pipeline._graphs, "checkout", side_effect=AssertionError("cache miss")):
+            with pytest.raises(AssertionError, match="cache miss"):
+                pipeline.get_probabilities(_load_as_xarray(input_dataset))
+
+    @pytest.mark.parametrize(
+        "input_, proj",
+        [
+            (TestData.DATA_1_CHANNEL, TestProjects.PIXEL_CLASS_1_CHANNEL_XY),
+        ],
+    )
+    def test_result_cache_budget(self, test_data_lookup: ApiTestDataLookup, input_, proj):
+        project_path = test_data_lookup.find_project(proj)
+        input_dataset = test_data_lookup.find_dataset(input_)
+
+        # results don't fit into the budget and are not kept, but are read-only like all results with a cache
+        pipeline = PixelClassificationPipeline.from_ilp_file(project_path, result_cache_bytes=1)
+        prediction = pipeline.get_probabilities(_load_as_xarray(input_dataset))
+        assert not prediction.values.flags.writeable
+        with mock.patch.object(pipeline._graphs, "checkout", side_effect=AssertionError("cache miss")):
+            with pytest.raises(AssertionError, match="cache miss"):
+                pipeline.get_probabilities(_load_as_xarray(input_dataset))
+
+        # caching is off by default
+        pipeline = PixelClassificationPipeline.from_ilp_file(project_path)
+        prediction = pipeline.get_probabilities(_load_as_xarray(input_dataset))
+        assert prediction.values.flags.writeable
+        assert not pipeline._results
+
+    @pytest.mark.parametrize(
+        "input_, proj",
+        [
+            (TestData.DATA_1_CHANNEL, TestProjects.PIXEL_CLASS_1_CHANNEL_XY),
+        ],
+    )
+    def test_predict_concurrently(self, test_data_lookup: ApiTestDataLookup, input_, proj):
+        project_path = test_data_lookup.find_project(proj)
+        input_dataset = test_data_lookup.find_dataset(input_)
+
+        # no result cache, every call has to be predicted
+        pipeline = PixelClassificationPipeline.from_ilp_file(project_path, result_cache_bytes=0)
+
+        data = _load_as_xarray(input_dataset)
+        first_axis, second_axis = [d for d in data.dims if d in "xyz"][:2]
+        inputs = [
+            data,
+            data.isel({first_axis: slice(None, None, -1)}).copy(),
+            data.isel({second_axis: slice(None, None, -1)}).copy(),
+            data.isel({first_axis: slice(0, data.sizes[first_axis] // 2)}).copy(),
+        ]
+        expected_predictions = [pipeline.get_probabilities(input_data) for input_data in inputs]
+
+        # keep every graph checked out until all threads have one, so each call needs a graph of its own
+        checkout = pipeline._graphs.checkout
+        barrier = threading.Barrier(len(inputs))
+        used_graphs = []
+
+        @contextmanager
+        def checkout_and_wait():
+            with checkout() as graph:
+                used_graphs.append(graph)
+                barrier.wait(timeout=60)
+                yield graph
+
+        with mock.patch.object(pipeline._graphs, "checkout", checkout_and_wait):
+            with ThreadPoolExecutor(max_workers=len(inputs)) as executor:
+                predictions = list(executor.map(pipeline.get_probabilities, inputs))
+
+        assert len({id(graph) for graph in used_graphs}) == len(inputs)
+        # idle graphs don't hold on to their last input
+        assert not any(graph.reorder_op.Input.ready() for graph in used_graphs)
+        for prediction, expected_prediction in zip(predictions, expected_predictions):
+            assert prediction.dims == expected_prediction.dims
+            np.testing.assert_allclose(prediction, expected_prediction, rtol=1e-6)
+
     @pytest.mark.parametrize(
         "input_, proj",
         [
@@ -221,3 +327,21 @@ class TestIlastikApiAutocontext:
 
         with pytest.raises(ValueError):
             pipeline.get_probabilities_stage_2(_load_as_xarray(input_dataset))
+
+
+def test_content_key_memory_layouts():
+    data = np.random.rand(5, 6, 2).astype(np.float32)
+    c_order = vigra.taggedView(data, "yxc")
+    # channel-first in memory, as in VigraArrays with default 'V' order
+    channels_first = vigra.taggedView(np.ascontiguousarray(data.transpose(2, 0, 1)), "cyx").withAxes("yxc")
+    assert not channels_first.view(np.ndarray).flags.c_contiguous
+    assert not channels_first.view(np.ndarray).flags.f_contiguous
+
+    assert _content_key(c_order) is not None
+    assert _content_key(channels_first) is not None
+    same_data = vigra.taggedView(np.ascontiguousarray(data.transpose(2, 0, 1)), "cyx").withAxes("yxc")
+    assert _content_key(channels_first) == _content_key(same_data)
+    # same values in a different memory layout
+    assert _content_key(c_order) != _content_key(channels_first)
+    # not dense in memory
+    assert _content_key(c_order[::2]) is None
@@ -0,0 +1,63 @@
+import pytest
+from qtpy.QtCore import QObject
+
+from ilastik.utility.gui import ThunkEvent, ThunkEventHandler
+
+
+@pytest.fixture
+def handler(qtbot):
+    parent = QObject()
+    yield ThunkEventHandler(parent)
+    parent.deleteLater()
+
+
+def test_post_is_not_synchronous(qtbot, handler):
+    calls = []
+    handler.post(calls.append, 1)
+    assert calls == []
+
+    qtbot.waitUntil(lambda: calls == [1])
+
+
+def test_post_keeps_order(qtbot, handler):
+    calls = []
+    handler.post(calls.append, 1)
+    handler.post(calls.append, 2)
+
+    qtbot.waitUntil(lambda: len(calls) == 2)
+    assert calls == [1, 2]
+
+
+def test_post_coalesces_identical_calls(qtbot, handler):
+    calls = []
+    handler.post(calls.append, 1)
+    handler.post(calls.append, 2)
+    handler.post(calls.append, 1)
+    handler.post(calls.append, 3)
+
+    qtbot.waitUntil(lambda: 3 in calls)
+    # Only the latest post of the duplicate is executed, at its own position
+    assert calls == [2, 1, 3]
+
+
+def test_post_unhashable_args_are_not_coalesced(qtbot, handler):
+    calls = []
+    handler.post(calls.append, [1])
+    handler.post(calls.append, [1])
+
+    qtbot.waitUntil(lambda: len(calls) == 2)
+    assert calls == [[1], [1]]
+
+
+def test_send_is_synchronous(qtbot, handler):
+    calls = []
+    handler.send(calls.append, 1)
+    assert calls == [1]
+
+
+def test_thunk_event_post_goes_through_event_filter(qtbot, handler):
+    calls = []
+    ThunkEvent.post(handler.parent(), calls.append, 1)
+    assert calls == []
+
+    qtbot.waitUntil(lambda: calls == [1])
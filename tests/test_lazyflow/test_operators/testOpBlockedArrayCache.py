@@ -243,6 +243,8 @@ class TestOpBlockedArrayCache:
             # We haven't accessed this data yet,
             # but fixAtCurrent is True so the cache gives us zeros
             assert (data == 0).all()
+            # ...without allocating blocks for them
+            assert opCache.usedMemory() == 0
 
             opCache.fixAtCurrent.setValue(False)
 
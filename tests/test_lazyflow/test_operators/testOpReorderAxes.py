@@ -265,6 +265,31 @@ class TestOpReorderAxes(unittest.TestCase):
         with pytest.raises(RequestError):
             req.wait()
 
+    def test_same_axis_order(self):
+        source_op = OpArrayProvider(graph=self.graph)
+        data = numpy.random.default_rng(42).integers(0, 255, (3, 4, 5, 6, 2))
+        data = vigra.taggedView(data, vigra.defaultAxistags("tzyxc"))
+        source_op.Input.setValue(data)
+        self.operator.Input.connect(source_op.Output)
+
+        dirty_rois = []
+        self.operator.Output.notifyDirty(lambda slot, roi: dirty_rois.append((tuple(roi.start), tuple(roi.stop))))
+
+        assert self.operator.Output.meta.axistags == data.axistags
+        numpy.testing.assert_array_equal(self.operator.Output[:].wait(), data)
+        key = numpy.s_[1:2, 1:3, 2:4, 0:5, 1:2]
+        numpy.testing.assert_array_equal(self.operator.Output[key].wait(), data[key])
+
+        assert self.operator._is_passthrough is True
+
+        source_op.Output.setDirty((0, 1, 2, 3, 0), (1, 2, 3, 4, 1))
+        assert dirty_rois == [((0, 1, 2, 3, 0), (1, 2, 3, 4, 1))]
+
+        # a different output order goes through the reordering again
+        self.operator.AxisOrder.setValue("tczyx")
+        assert self.operator._is_passthrough is False
+        numpy.testing.assert_array_equal(self.operator.Output[:].wait(), data.transpose(0, 4, 1, 2, 3))
+
     def test_preserve_axis_units(self):
         source_op = OpArrayProvider(graph=self.graph)
         data = numpy.random.default_rng(1337).integers(0, 255, (3, 4, 5, 6, 7))
@@ -11,6 +11,7 @@ from lazyflow.roi import (
     TinyVector,
     nonzero_bounding_box,
     containing_rois,
+    intersecting_rois,
     getIntersectingBlocks,
 )
 
@@ -140,6 +141,34 @@ class TestContainingRois(object):
         assert result.shape == (0,)
 
 
+class TestIntersectingRois(object):
+    def testBasic(self):
+        rois = [([0, 0, 0], [10, 10, 10]), ([5, 3, 2], [11, 12, 13]), ([4, 6, 4], [5, 9, 9])]
+
+        result = intersecting_rois(rois, ([4, 7, 6], [6, 8, 8]))
+        assert (result == rois).all()
+
+        result = intersecting_rois(rois, ([10, 0, 0], [12, 5, 5]))
+        assert (result == [([5, 3, 2], [11, 12, 13])]).all()
+
+    def testTouchingRoisDontIntersect(self):
+        rois = [([0, 0, 0], [10, 10, 10]), ([5, 3, 2], [11, 12, 13]), ([4, 6, 4], [5, 9, 9])]
+
+        result = intersecting_rois(rois, ([11, 0, 0], [20, 20, 20]))
+        assert result.shape == (0, 2, 3)
+
+    def testEmptyInput(self):
+        rois = []
+        result = intersecting_rois(rois, ([100, 100, 100], [200, 200, 200]))
+        assert result.shape == (0,)
+
+    def testEmptyRoiDoesntIntersect(self):
+        rois = [([0, 0, 0], [10, 10, 10]), ([5, 3, 2], [11, 12, 13]), ([4, 6, 4], [5, 9, 9])]
+
+        result = intersecting_rois(rois, ([4, 7, 6], [4, 8, 8]))
+        assert result.shape == (0, 2, 3)
+
+
 class TestGetIntersectionBlocks(TestCase):
     def test_invalid_parameters(self):
         with self.assertRaises(AssertionError):